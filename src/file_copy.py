@@ -0,0 +1,69 @@
+"""Fast file copies shared by the photo scripts."""
+
+import os
+import shutil
+import sys
+import ctypes
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# macOS clonefile(2), used to copy files as APFS copy-on-write clones
+_clonefile = None
+if sys.platform == 'darwin':
+    try:
+        _clonefile = ctypes.CDLL(None, use_errno=True).clonefile
+        _clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+        _clonefile.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        _clonefile = None
+
+# Linux FICLONE ioctl, which reflinks a whole file on Btrfs and XFS
+FICLONE = 0x40049409
+# Bytes requested per os.copy_file_range call
+COPY_CHUNK_BYTES = 64 * 1024 * 1024
+
+def clone_file(source_path, target_path):
+    """Create target_path as a copy-on-write clone of source_path; return False if unsupported."""
+    # clonefile(2) is near-instant on APFS whatever the file size; it fails on other
+    # volumes, across volumes, or if the target exists
+    if _clonefile is not None:
+        return _clonefile(os.fsencode(source_path), os.fsencode(target_path), 0) == 0
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open(source_path, 'rb') as src, open(target_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(target_path):
+            os.unlink(target_path)
+        return False
+    return True
+
+def _copy_file_range(source_path, target_path):
+    """Copy a file with os.copy_file_range; return False if it didn't copy every byte."""
+    try:
+        with open(source_path, 'rb') as src, open(target_path, 'wb') as dst:
+            size = os.fstat(src.fileno()).st_size
+            copied = 0
+            while True:
+                sent = os.copy_file_range(src.fileno(), dst.fileno(), COPY_CHUNK_BYTES)
+                if not sent:
+                    break
+                copied += sent
+    except (AttributeError, OSError):
+        # No copy_file_range on this platform, or not between these filesystems
+        return False
+    # Some filesystem combinations return 0 before the end of the file, which
+    # would otherwise leave an empty or short copy
+    return copied == size
+
+def fast_copy(source_path, target_path):
+    """Copy a file's data and its permission bits and timestamps, as cheaply as the platform allows."""
+    # A clone shares the data blocks; otherwise copy_file_range moves the data
+    # inside the kernel, and copyfile covers everything else
+    if not clone_file(source_path, target_path) and not _copy_file_range(source_path, target_path):
+        shutil.copyfile(source_path, target_path)
+    shutil.copystat(source_path, target_path)
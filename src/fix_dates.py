@@ -1,66 +1,178 @@
 #!/usr/bin/env python3
 
 import os
-from pathlib import Path
+import struct
 from tqdm import tqdm
 from PIL import Image
 from PIL.ExifTags import TAGS
 import piexif
 from datetime import datetime
 import subprocess
-import json
 import platform
+import exiftool
 
-def get_creation_date_exiftool(file_path):
-    """Get creation date using exiftool."""
+DATE_FIELDS = ['ContentCreateDate', 'CreationDate', 'DateTimeOriginal', 'CreateDate', 'FileModifyDate']
+
+# -fast2 stops reading QuickTime-based files at the mdat atom and PNGs at IDAT, but these
+# formats can keep their dates after that point, so they are only read with -fast
+FAST2_UNSAFE_EXTENSIONS = {'.mov', '.mp4', '.m4v', '.3gp', '.heic', '.heif', '.png'}
+
+# Formats whose EXIF dates are read in-process before falling back to exiftool,
+# and formats only tried with Pillow after exiftool found nothing
+PILLOW_FIRST_EXTENSIONS = {'.jpg', '.jpeg', '.tif', '.tiff', '.png'}
+PILLOW_FALLBACK_EXTENSIONS = {'.heic', '.bmp'}
+
+# EXIF tag ids read by _read_exif_datetime, and how much of a file it looks at
+DATETIME = 0x0132
+EXIF_IFD_POINTER = 0x8769
+DATETIME_ORIGINAL = 0x9003
+DATETIME_DIGITIZED = 0x9004
+EXIF_HEADER_BYTES = 64 * 1024
+
+def _parse_exif_dt(date_str):
+    """Parse an EXIF 'YYYY:MM:DD HH:MM:SS' date, ignoring any sub-second or timezone suffix."""
+    # Slicing is far cheaper than strptime, which this runs for every file.
+    # Malformed values raise ValueError from int() or datetime() just like strptime.
+    s = date_str[:19]
+    return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                    int(s[11:13]), int(s[14:16]), int(s[17:19]))
+
+def get_creation_date_from_tags(data):
+    """Pick the creation date from one file's exiftool tags."""
+    # Try different date fields in order of preference
+    for field in DATE_FIELDS:
+        if field in data and data[field]:
+            try:
+                return _parse_exif_dt(str(data[field]).strip())
+            except ValueError:
+                continue
+    return None
+
+def get_creation_dates_exiftool(files):
+    """Get creation dates for many files using a single exiftool process."""
+    if not files:
+        return {}
+    fast = [str(path) for path in files if os.path.splitext(path)[1].lower() in FAST2_UNSAFE_EXTENSIONS]
+    fast2 = [str(path) for path in files if os.path.splitext(path)[1].lower() not in FAST2_UNSAFE_EXTENSIONS]
     try:
-        # Run exiftool and get JSON output with all possible date fields
-        result = subprocess.run(
-            ['exiftool', '-json', 
-             '-ContentCreateDate', '-CreationDate', '-DateTimeOriginal', 
-             '-CreateDate', '-FileModifyDate', file_path],
-            capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            return None
-        
-        data = json.loads(result.stdout)[0]
-        
-        # Try different date fields in order of preference
-        for field in ['ContentCreateDate', 'CreationDate', 'DateTimeOriginal', 'CreateDate', 'FileModifyDate']:
-            if field in data and data[field]:
-                date_str = data[field]
-                # Handle various date formats
-                try:
-                    if '+' in date_str:
-                        date_str = date_str.split('+')[0].strip()
-                    if '.' in date_str:
-                        date_str = date_str.split('.')[0].strip()
-                    return datetime.strptime(date_str, '%Y:%m:%d %H:%M:%S')
-                except ValueError:
-                    continue
-        return None
+        # One stay_open exiftool session reads every file instead of one process per file.
+        # Only the date tags are requested, and -fast/-fast2 skip trailers and MakerNotes.
+        with exiftool.ExifToolHelper(common_args=['-n'], check_execute=False) as et:
+            metadata = []
+            if fast2:
+                metadata += et.get_tags(fast2, tags=DATE_FIELDS, params=['-fast2'])
+            if fast:
+                metadata += et.get_tags(fast, tags=DATE_FIELDS, params=['-fast'])
     except Exception as e:
         print(f"ExifTool error: {str(e)}")
+        return {}
+
+    by_name = {str(path): path for path in files}
+    dates = {}
+    for data in metadata:
+        path = by_name.get(data.get('SourceFile'))
+        if path is None:
+            continue
+        date_obj = get_creation_date_from_tags(data)
+        if date_obj:
+            dates[path] = date_obj
+    return dates
+
+def _find_tiff_block(head):
+    """Return the TIFF-structured EXIF block from the start of a JPEG or TIFF file."""
+    if head[:4] in (b'II*\0', b'MM\0*'):
+        return head
+    if head[:2] != b'\xff\xd8':
+        raise ValueError("not a JPEG or TIFF file")
+
+    # Walk the JPEG segments up to the image data looking for the APP1 Exif segment
+    pos = 2
+    while pos + 4 <= len(head):
+        if head[pos] != 0xFF:
+            raise ValueError("corrupt JPEG segment")
+        marker = head[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker in (0xDA, 0xD9):
+            # Start of scan / end of image: there is no EXIF block
+            return None
+        length = int.from_bytes(head[pos + 2:pos + 4], 'big')
+        if marker == 0xE1 and head[pos + 4:pos + 10] == b'Exif\0\0':
+            return head[pos + 10:pos + 2 + length]
+        pos += 2 + length
+    raise ValueError("EXIF block not found in the file header")
+
+def _read_exif_datetime(file_path):
+    """
+    Read the capture date string straight from a JPEG's or TIFF's EXIF block.
+
+    Only the IFD0 and Exif IFD entries are visited, instead of decoding every tag.
+    Returns None when there is no date tag, and raises ValueError (or struct.error)
+    when the EXIF data can't be walked here.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(EXIF_HEADER_BYTES)
+    tiff = _find_tiff_block(head)
+    if tiff is None:
         return None
 
+    endian = '<' if tiff[:2] == b'II' else '>'
+
+    def read_ifd(offset):
+        """Map tag id to (type, count, value/offset) for one IFD."""
+        (count,) = struct.unpack_from(endian + 'H', tiff, offset)
+        entries = {}
+        for i in range(count):
+            tag, kind, n, value = struct.unpack_from(endian + 'HHII', tiff, offset + 2 + 12 * i)
+            entries[tag] = (kind, n, value)
+        return entries
+
+    def read_ascii(entry):
+        kind, n, offset = entry
+        if kind != 2 or n <= 4 or offset + n > len(tiff):
+            raise ValueError("unexpected date entry")
+        return tiff[offset:offset + n].rstrip(b'\0 ').decode('ascii')
+
+    (ifd0_offset,) = struct.unpack_from(endian + 'I', tiff, 4)
+    ifd0 = read_ifd(ifd0_offset)
+    exif_ifd = read_ifd(ifd0[EXIF_IFD_POINTER][2]) if EXIF_IFD_POINTER in ifd0 else {}
+
+    # Same preference as the piexif path: DateTimeOriginal, DateTimeDigitized, DateTime
+    for ifd, tag in ((exif_ifd, DATETIME_ORIGINAL), (exif_ifd, DATETIME_DIGITIZED), (ifd0, DATETIME)):
+        if tag in ifd:
+            return read_ascii(ifd[tag])
+    return None
+
 def get_creation_date_pillow(file_path):
-    """Get creation date using Pillow/piexif."""
+    """Get creation date from EXIF, parsed directly or with Pillow/piexif."""
+    try:
+        date_original = _read_exif_datetime(file_path)
+        return _parse_exif_dt(date_original) if date_original else None
+    except (OSError, ValueError, struct.error):
+        # Not a JPEG/TIFF or an EXIF layout the direct reader can't handle
+        pass
+
     try:
         with Image.open(file_path) as img:
             exif_dict = piexif.load(img.info.get('exif', b''))
             
-            # Try to get the original date from EXIF
+            # Try to get the original date from EXIF, in the same order exiftool's
+            # DateTimeOriginal/CreateDate are preferred
             date_original = None
-            if '0th' in exif_dict and piexif.ImageIFD.DateTime in exif_dict['0th']:
+            exif = exif_dict.get('Exif') or {}
+            if piexif.ExifIFD.DateTimeOriginal in exif:
+                date_original = exif[piexif.ExifIFD.DateTimeOriginal]
+            elif piexif.ExifIFD.DateTimeDigitized in exif:
+                date_original = exif[piexif.ExifIFD.DateTimeDigitized]
+            elif '0th' in exif_dict and piexif.ImageIFD.DateTime in exif_dict['0th']:
                 date_original = exif_dict['0th'][piexif.ImageIFD.DateTime]
-            elif 'Exif' in exif_dict and piexif.ExifIFD.DateTimeOriginal in exif_dict['Exif']:
-                date_original = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal]
             
             if date_original:
                 if isinstance(date_original, bytes):
                     date_original = date_original.decode()
-                return datetime.strptime(date_original, '%Y:%m:%d %H:%M:%S')
+                return _parse_exif_dt(date_original)
     except Exception:
         return None
     return None
@@ -76,6 +188,46 @@ def set_macos_creation_date(file_path, date_obj):
         print(f"SetFile error: {str(e)}")
         return False
 
+def set_macos_creation_dates(pairs):
+    """Set the macOS creation date of many (file_path, date_obj) pairs, returning the files that failed."""
+    if not pairs:
+        return []
+    # Feed every "-d DATE FILE" triple to SetFile through a single xargs process,
+    # which runs the SetFile calls in parallel instead of forking each one from Python
+    args = []
+    for file_path, date_obj in pairs:
+        args += [b'-d', date_obj.strftime('%m/%d/%Y %H:%M:%S').encode(), os.fsencode(file_path)]
+    try:
+        result = subprocess.run(
+            ['xargs', '-0', '-n', '3', '-P', str(os.cpu_count() or 1), 'SetFile'],
+            input=b'\0'.join(args), capture_output=True
+        )
+        if result.returncode == 0:
+            return []
+    except Exception as e:
+        print(f"SetFile error: {str(e)}")
+
+    # Some call failed; retry one at a time to find out which files it was
+    return [file_path for file_path, date_obj in pairs if not set_macos_creation_date(file_path, date_obj)]
+
+def walk_files(folder_path):
+    """Recursively yield the path of every file in a folder."""
+    # os.scandir's DirEntry knows the entry type without an extra stat per file
+    stack = [str(folder_path)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            # Skip folders that can't be listed, e.g. .Trashes on a volume or a
+            # privacy-protected Photos library, the way rglob did
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path
+
 def fix_file_dates(folder_path):
     """
     Set the file creation date to match the content creation date from metadata.
@@ -87,10 +239,7 @@ def fix_file_dates(folder_path):
         print("Warning: This script is optimized for macOS. File creation dates might not be set correctly on other systems.")
 
     # Get all files
-    files = []
-    for path in Path(folder_path).rglob('*'):
-        if path.is_file():
-            files.append(path)
+    files = list(walk_files(folder_path))
 
     if not files:
         print("No files found in the specified folder.")
@@ -100,37 +249,49 @@ def fix_file_dates(folder_path):
     processed_count = 0
     errors = []
 
-    for file_path in tqdm(files):
-        try:
-            # Try different methods to get creation date
-            date_obj = None
-            
-            # Try exiftool first (works with most file types)
-            date_obj = get_creation_date_exiftool(file_path)
-            
-            # If exiftool failed and it's an image, try Pillow
-            if not date_obj and file_path.suffix.lower() in {'.jpg', '.jpeg', '.heic', '.png', '.tiff', '.bmp'}:
-                date_obj = get_creation_date_pillow(file_path)
-            
+    # Common image formats are read with Pillow, which needs no subprocess
+    dates = {}
+    remaining = []
+    for file_path in tqdm(files, desc="Reading image dates"):
+        if os.path.splitext(file_path)[1].lower() in PILLOW_FIRST_EXTENSIONS:
+            date_obj = get_creation_date_pillow(file_path)
             if date_obj:
-                success = True
-                # Set macOS creation date if on macOS
-                if is_macos:
-                    success = set_macos_creation_date(file_path, date_obj)
-                
-                # Set modification time
-                if success:
-                    timestamp = date_obj.timestamp()
-                    os.utime(file_path, (timestamp, timestamp))
-                    processed_count += 1
-                else:
-                    errors.append((file_path, "Failed to set creation date"))
-            else:
-                errors.append((file_path, "No creation date found in metadata"))
+                dates[file_path] = date_obj
+                continue
+        remaining.append(file_path)
+
+    # Read dates for everything else in one batch with exiftool (works with most file types)
+    dates.update(get_creation_dates_exiftool(remaining))
+
+    to_update = []
+    for file_path in tqdm(files):
+        date_obj = dates.get(file_path)
+        
+        # If exiftool failed and it's an image Pillow hasn't tried yet, try Pillow
+        if not date_obj and os.path.splitext(file_path)[1].lower() in PILLOW_FALLBACK_EXTENSIONS:
+            date_obj = get_creation_date_pillow(file_path)
+        
+        if date_obj:
+            to_update.append((file_path, date_obj))
+        else:
+            errors.append((file_path, "No creation date found in metadata"))
+
+    # Set macOS creation dates for every file in one batch if on macOS
+    failed = set()
+    if is_macos:
+        failed = set(set_macos_creation_dates(to_update))
 
+    for file_path, date_obj in to_update:
+        if file_path in failed:
+            errors.append((file_path, "Failed to set creation date"))
+            continue
+        try:
+            # Set modification time
+            timestamp = date_obj.timestamp()
+            os.utime(file_path, (timestamp, timestamp))
+            processed_count += 1
         except Exception as e:
             errors.append((file_path, str(e)))
-            continue
 
     # Print summary
     print(f"\nProcessing complete!")
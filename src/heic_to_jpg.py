@@ -1,13 +1,41 @@
 #!/usr/bin/env python3
 
+import io
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
-from PIL import Image, ImageOps
-from pillow_heif import register_heif_opener, HeifImagePlugin
+from PIL import Image, ImageOps, features
+from pillow_heif import register_heif_opener, open_heif, HeifImagePlugin
 import subprocess
 import json
 from datetime import datetime
+import exiftool
+
+try:
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJPF_RGBA, TJSAMP_420
+except ImportError:  # TurboJPEG is optional; Pillow's JPEG encoder is used without it
+    TurboJPEG = None
+
+# Per-process TurboJPEG handle, created once by _init_worker
+_turbo_jpeg = None
+_heif_registered = False
+
+def _register_heif():
+    """Register the HEIF opener with Pillow, once per process."""
+    global _heif_registered
+    if not _heif_registered:
+        register_heif_opener()
+        _heif_registered = True
+
+_register_heif()
+
+def _tmp_jpg_path(jpg_path):
+    """Return where a JPG is staged until its metadata has been copied."""
+    # Kept with a .jpg extension so exiftool writes to it like any other JPEG
+    return jpg_path.with_name(jpg_path.stem + '.tmp.jpg')
 
 def get_heic_metadata(file_path):
     """Get all metadata from HEIC file using exiftool."""
@@ -23,17 +51,14 @@ def get_heic_metadata(file_path):
         print(f"Error reading metadata: {str(e)}")
         return None
 
-def copy_metadata_to_jpg(heic_path, jpg_path):
-    """Copy all metadata from HEIC to JPG using exiftool."""
+def copy_metadata_to_jpg(et, heic_path, jpg_path):
+    """Copy all metadata from HEIC to JPG using a running exiftool session."""
     try:
         # Copy all metadata except orientation since we've already applied it
         # Use -a flag to preserve all edits and adjustments
-        subprocess.run(
-            ['exiftool', '-TagsFromFile', str(heic_path),
-             '-all:all', '-orientation#=1', '-overwrite_original',
-             '-a', str(jpg_path)],
-            check=True, capture_output=True
-        )
+        et.execute('-TagsFromFile', str(heic_path),
+                   '-all:all', '-orientation#=1', '-overwrite_original',
+                   '-a', str(jpg_path))
         
         # Remove the backup file created by exiftool
         backup_file = Path(str(jpg_path) + '_original')
@@ -45,24 +70,129 @@ def copy_metadata_to_jpg(heic_path, jpg_path):
         print(f"Error copying metadata: {str(e)}")
         return False
 
-def has_edits(heic_path):
-    """Check if the HEIC file has been edited."""
+def find_edited_files(et, heic_files):
+    """Return the set of HEIC files that have been edited, reading them all in one exiftool call."""
+    # exiftool exits non-zero if any one file can't be read, but still returns an entry
+    # for every file it could; don't let one bad HEIC hide the edits of all the others
+    check_execute = et.check_execute
+    et.check_execute = False
     try:
-        result = subprocess.run(
-            ['exiftool', '-json', '-AdjustmentType', '-HasCrop', str(heic_path)],
-            capture_output=True, text=True
-        )
-        if result.returncode == 0:
-            data = json.loads(result.stdout)[0]
-            return 'AdjustmentType' in data or 'HasCrop' in data
-        return False
-    except:
+        metadata = et.get_tags([str(path) for path in heic_files], tags=['AdjustmentType', 'HasCrop'])
+    except Exception as e:
+        print(f"Error reading edit metadata: {str(e)}")
+        return set()
+    finally:
+        et.check_execute = check_execute
+
+    by_name = {str(path): path for path in heic_files}
+    edited = set()
+    for data in metadata:
+        # Tags come back group-prefixed, e.g. "XMP:AdjustmentType"
+        tags = {key.split(':')[-1] for key in data}
+        if 'AdjustmentType' in tags or 'HasCrop' in tags:
+            edited.add(by_name.get(data.get('SourceFile')))
+    edited.discard(None)
+    return edited
+
+def extract_previews(et, heic_files):
+    """Write each file's embedded PreviewImage next to it as <name>.tmp.jpg in one exiftool pass."""
+    for heic_file in heic_files:
+        # exiftool -w never overwrites, so clear out leftovers of an interrupted run
+        _tmp_jpg_path(heic_file.with_suffix('.jpg')).unlink(missing_ok=True)
+    try:
+        et.execute('-b', '-PreviewImage', '-w', '%d%f.tmp.jpg', *[str(path) for path in heic_files])
+    except Exception:
+        # Files without a preview are reported as failures; they are converted normally instead
+        pass
+
+def _init_worker():
+    """Set up a conversion worker process."""
+    global _turbo_jpeg
+    # Workers started with spawn import this module fresh; forked ones are already registered
+    _register_heif()
+
+    if TurboJPEG is not None and _turbo_jpeg is None:
+        try:
+            _turbo_jpeg = TurboJPEG()
+        except (OSError, RuntimeError):
+            # The libturbojpeg shared library could not be loaded
+            _turbo_jpeg = None
+
+def _encode_jpeg(heic_file):
+    """Decode a HEIC file and return it encoded as quality 95 JPG bytes."""
+    if _turbo_jpeg is not None:
+        # libheif applies the HEIF rotation while decoding, so its pixel buffer can go
+        # straight to TurboJPEG without building (and copying) a Pillow image
+        heif = open_heif(heic_file, convert_hdr_to_8bit=True)
+        if heif.mode in ('RGB', 'RGBA'):
+            width, height = heif.size
+            channels = len(heif.mode)
+            pixels = np.ndarray((height, width, channels), dtype=np.uint8, buffer=heif.data,
+                                strides=(heif.stride, channels, 1))
+            # Same 4:2:0 subsampling Pillow uses at this quality
+            return _turbo_jpeg.encode(pixels, quality=95,
+                                      pixel_format=TJPF_RGBA if channels == 4 else TJPF_RGB,
+                                      jpeg_subsample=TJSAMP_420)
+
+    with Image.open(heic_file) as img:
+        # Apply orientation based on EXIF
+        img = ImageOps.exif_transpose(img)
+
+        # Convert and save as JPG with high quality
+        buffer = io.BytesIO()
+        img.convert('RGB').save(buffer, 'JPEG', quality=95)
+        return buffer.getvalue()
+
+def is_already_converted(heic_file):
+    """Check whether an earlier run already wrote a JPG for this HEIC file since it last changed."""
+    try:
+        jpg_stat = heic_file.with_suffix('.jpg').stat()
+    except FileNotFoundError:
         return False
+    return jpg_stat.st_size > 0 and jpg_stat.st_mtime >= heic_file.stat().st_mtime
+
+def _convert_one(heic_file, has_iphone_edits):
+    """Write the JPG for one HEIC file to its staging path, returning (heic_file, jpg_path, encoded, error).
+
+    encoded is False when the extracted preview of an edited photo is used instead.
+    """
+    try:
+        # Create output path
+        jpg_path = heic_file.with_suffix('.jpg')
+        tmp_path = _tmp_jpg_path(jpg_path)
+
+        # Edited photos already had their preview extracted by extract_previews
+        if has_iphone_edits:
+            print(f"\nProcessing edited photo: {heic_file.name}")
+
+        # If no preview image or no edits, convert normally. Any JPG already next to an
+        # unedited photo is older than it (see is_already_converted) and gets replaced.
+        if not has_iphone_edits or not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            if has_iphone_edits:
+                print(f"No preview image found for edited photo: {heic_file.name}, converting original")
+            else:
+                print(f"\nProcessing original photo: {heic_file.name}")
+            # The worker writes its own JPG, so the encoded bytes never travel back to
+            # the parent and the write overlaps other workers' decoding. The JPG only
+            # gets its real name once its metadata is copied, so an interrupted run
+            # never leaves a JPG that a later run would take as already converted.
+            jpg_bytes = _encode_jpeg(heic_file)
+            with open(tmp_path, 'wb') as f:
+                f.write(jpg_bytes)
+            return heic_file, jpg_path, True, None
+
+        return heic_file, jpg_path, False, None
+    except Exception as e:
+        # Don't leave a partly written JPG behind
+        _tmp_jpg_path(heic_file.with_suffix('.jpg')).unlink(missing_ok=True)
+        return heic_file, None, False, str(e)
 
 def convert_heic_to_jpg(folder_path, delete_original=False):
     """Convert all HEIC files in a folder to JPG format, preserving metadata, orientation, and edits."""
-    # Register HEIF opener with Pillow
-    register_heif_opener()
+    # JPEG encoding is the hottest step after HEIC decode and is several times slower without SIMD
+    if TurboJPEG is None and not features.check_feature('libjpeg_turbo'):
+        print("Warning: Pillow is not built with libjpeg-turbo. JPEG encoding will be much slower; "
+              "install the official Pillow wheels or build Pillow against libjpeg-turbo.")
 
     # Get all HEIC files
     heic_files = []
@@ -74,59 +204,69 @@ def convert_heic_to_jpg(folder_path, delete_original=False):
         print("No HEIC files found in the specified folder.")
         return
 
+    # Skip files converted by an earlier run
+    found_count = len(heic_files)
+    heic_files = [heic_file for heic_file in heic_files if not is_already_converted(heic_file)]
+    skipped_count = found_count - len(heic_files)
+    if skipped_count:
+        print(f"Skipping {skipped_count} HEIC files that already have an up-to-date JPG.")
+    if not heic_files:
+        print("Nothing to convert.")
+        return
+
     print(f"Found {len(heic_files)} HEIC files. Converting...")
     converted_count = 0
     edited_count = 0
     original_count = 0
     errors = []
 
-    for heic_file in tqdm(heic_files):
-        try:
-            # Create output path
-            jpg_path = heic_file.with_suffix('.jpg')
-            
-            # Check if file has edits
-            has_iphone_edits = has_edits(heic_file)
-            
-            # First, try to extract the edited version if it exists
-            if has_iphone_edits:
-                print(f"\nProcessing edited photo: {heic_file.name}")
-                subprocess.run(
-                    ['exiftool', '-b', '-PreviewImage', str(heic_file)],
-                    stdout=open(jpg_path, 'wb'),
-                    check=False  # Don't raise error if no preview exists
-                )
-            
-            # If no preview image or no edits, convert normally
-            if not os.path.exists(jpg_path) or os.path.getsize(jpg_path) == 0:
-                if has_iphone_edits:
-                    print(f"No preview image found for edited photo: {heic_file.name}, converting original")
+    # Metadata is read and copied here in the parent through one long-lived exiftool process
+    with exiftool.ExifToolHelper() as et:
+        # Try to use the edited version of edited photos: their embedded previews
+        # are extracted in bulk before any conversion starts
+        edited_files = find_edited_files(et, heic_files)
+        if edited_files:
+            extract_previews(et, sorted(edited_files))
+        has_iphone_edits = [heic_file in edited_files for heic_file in heic_files]
+
+        # Decode, encode and write are independent per file, so spread them over every
+        # core. Workers only hand back small status tuples, so results queued up in the
+        # parent stay cheap however far ahead the workers get. They are spawned rather
+        # than forked so they don't inherit the pipes of the running exiftool session.
+        converted = []
+        with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = executor.map(_convert_one, heic_files, has_iphone_edits, chunksize=8)
+            for heic_file, jpg_path, encoded, error in tqdm(results, total=len(heic_files)):
+                if error:
+                    errors.append((heic_file, error))
+                    continue
+
+                if encoded:
+                    original_count += 1
                 else:
-                    print(f"\nProcessing original photo: {heic_file.name}")
-                with Image.open(heic_file) as img:
-                    # Apply orientation based on EXIF
-                    img = ImageOps.exif_transpose(img)
-                    
-                    # Convert and save as JPG with high quality
-                    img.convert('RGB').save(jpg_path, 'JPEG', quality=95)
-                original_count += 1
-            else:
-                edited_count += 1
-            
-            # Copy all metadata from HEIC to JPG, but set orientation to normal
-            # since we've already applied the rotation
-            if copy_metadata_to_jpg(heic_file, jpg_path):
-                converted_count += 1
-                
-                # Delete original if requested and conversion was successful
-                if delete_original:
-                    os.remove(heic_file)
-            else:
-                errors.append((heic_file, "Failed to copy metadata"))
+                    edited_count += 1
+                converted.append((heic_file, jpg_path))
 
-        except Exception as e:
-            errors.append((heic_file, str(e)))
-            continue
+        for heic_file, jpg_path in tqdm(converted, desc="Copying metadata"):
+            tmp_path = _tmp_jpg_path(jpg_path)
+            try:
+                # Copy all metadata from HEIC to JPG, but set orientation to normal
+                # since we've already applied the rotation. Only then does the JPG
+                # get its real name and count as converted.
+                if copy_metadata_to_jpg(et, heic_file, tmp_path):
+                    os.replace(tmp_path, jpg_path)
+                    converted_count += 1
+
+                    # Delete original if requested and conversion was successful
+                    if delete_original:
+                        os.remove(heic_file)
+                else:
+                    errors.append((heic_file, "Failed to copy metadata"))
+                    tmp_path.unlink(missing_ok=True)
+            except Exception as e:
+                errors.append((heic_file, str(e)))
+                tmp_path.unlink(missing_ok=True)
 
     # Print summary
     print(f"\nConversion complete!")
@@ -7,23 +7,36 @@ def mov_deleter(directory_path):
     
     Args:
         directory_path (str): Path to the directory containing the files
+    
+    Returns:
+        list: Paths of the deleted MOV files
     """
-    # Get all HEIC files that start with IMG_
-    heic_files = [f for f in os.listdir(directory_path) 
-                  if f.upper().endswith('.HEIC') and f.startswith('IMG_')]
+    # Collect IMG_ HEIC base names and IMG_ MOV files in a single directory pass
+    heic_bases = set()
+    mov_paths = {}
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith('IMG_'):
+                upper_name = name.upper()
+                if upper_name.endswith('.HEIC'):
+                    heic_bases.add(name[:-5])
+                elif upper_name.endswith('.MOV'):
+                    mov_paths[name[:-4]] = entry.path
     
-    # Get base names without extension
-    heic_bases = [os.path.splitext(f)[0] for f in heic_files]
+    # Delete the MOV files that have a HEIC file with the same name,
+    # reporting them in one summary instead of a line per file
+    deleted = []
+    for base_name in heic_bases & mov_paths.keys():
+        mov_path = mov_paths[base_name]
+        try:
+            os.remove(mov_path)
+            deleted.append(mov_path)
+        except Exception as e:
+            print(f"Error deleting {mov_path}: {e}")
     
-    # Check for corresponding MOV files
-    for base_name in heic_bases:
-        mov_path = os.path.join(directory_path, base_name + '.MOV')
-        if os.path.exists(mov_path):
-            try:
-                os.remove(mov_path)
-                print(f"Deleted: {mov_path}")
-            except Exception as e:
-                print(f"Error deleting {mov_path}: {e}")
+    print(f"Deleted {len(deleted)} MOV files")
+    return deleted
 
 def main():
     import argparse
@@ -1,38 +1,96 @@
 #!/usr/bin/env python3
 
 import os
-import shutil
-from pathlib import Path
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-import subprocess
+import exiftool
+from file_copy import fast_copy
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic')
+# Size-matched files are compared on a hash of their first chunk before a full hash
+HEAD_HASH_BYTES = 64 * 1024
+HASH_CACHE_NAME = 'hash_cache.json'
 
 def get_image_files(folder):
-    """Recursively get all image files in a folder."""
-    image_extensions = {'.jpg', '.jpeg', '.png', '.heic'}
-    files = []
-    for path in Path(folder).rglob('*'):
-        if path.suffix.lower() in image_extensions:
-            files.append(path)
-    return files
-
-def copy_file_with_metadata(source_path, target_path):
-    """Copy file and preserve all metadata including creation dates."""
+    """Recursively yield the paths of all image files in a folder."""
+    # os.scandir avoids a Path object and an extra stat for every entry
+    stack = [str(folder)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            # Skip folders that can't be listed, e.g. .Trashes on a volume or a
+            # privacy-protected Photos library, the way rglob did
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif (entry.name.lower().endswith(IMAGE_EXTENSIONS)
+                      and entry.is_file(follow_symlinks=False)):
+                    yield entry.path
+
+def copy_file(source_path, target_path):
+    """Copy a file's data and its permission bits and timestamps; return (ok, error)."""
+    # Errors are returned rather than printed, so they don't break up the progress bar
     try:
-        # First, copy the file with shutil to handle the data
         os.makedirs(os.path.dirname(target_path), exist_ok=True)
-        shutil.copy2(source_path, target_path)
-        
-        # Then use exiftool to copy all metadata
-        subprocess.run(
-            ['exiftool', '-TagsFromFile', str(source_path), 
-             '-all:all', '-overwrite_original', str(target_path)],
-            check=True, capture_output=True
-        )
-        
-        return True
+        fast_copy(source_path, target_path)
+        return True, None
     except Exception as e:
-        print(f"Error copying file and metadata: {str(e)}")
-        return False
+        return False, f"Error copying file: {str(e)}"
+
+def copy_metadata(et, source_path, target_path):
+    """Copy all embedded metadata from source to target using a running exiftool session; return (ok, error)."""
+    try:
+        et.execute('-TagsFromFile', str(source_path),
+                   '-all:all', '-overwrite_original', str(target_path))
+        return True, None
+    except Exception as e:
+        return False, f"Error copying metadata: {str(e)}"
+
+def file_digest(path, cache, full=False):
+    """Hash the first 64 KiB of a file (or the whole file), reusing cached digests keyed by path, size and mtime."""
+    stat = os.stat(path)
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{'full' if full else 'head'}"
+    if key not in cache:
+        digest = hashlib.blake2b()
+        with open(path, 'rb') as f:
+            if full:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            else:
+                digest.update(f.read(HEAD_HASH_BYTES))
+        cache[key] = digest.hexdigest()
+    return cache[key]
+
+def has_same_content(path, candidates, cache):
+    """Check whether any candidate file (all the same size as path) has identical content."""
+    head = file_digest(path, cache)
+    for candidate in candidates:
+        # The first chunk rules out almost every different photo; confirm matches with a full hash
+        if (file_digest(candidate, cache) == head
+                and file_digest(candidate, cache, full=True) == file_digest(path, cache, full=True)):
+            return True
+    return False
+
+def load_hash_cache(cache_path):
+    """Load digests saved by an earlier merge into the same target."""
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_hash_cache(cache_path, cache):
+    """Save digests for the next merge into the same target."""
+    try:
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Could not save hash cache: {str(e)}")
 
 def merge_photos(source_folder, target_folder):
     """Merge photos from source folder into target folder if they don't exist, preserving all metadata."""
@@ -43,39 +101,60 @@ def merge_photos(source_folder, target_folder):
     backup_folder = os.path.join(target_folder, '_merged_photos_backup')
     os.makedirs(backup_folder, exist_ok=True)
 
-    # Get all image files
+    # Index target by filename and by size, keeping only names and paths rather than Path objects
     print("Scanning folders...")
-    source_files = get_image_files(source_folder)
-    target_files = get_image_files(target_folder)
+    target_filenames = set()
+    target_by_size = {}
+    for file in get_image_files(target_folder):
+        target_filenames.add(os.path.basename(file).lower())
+        target_by_size.setdefault(os.stat(file).st_size, []).append(file)
 
-    # Get set of filenames in target
-    target_filenames = {file.name.lower() for file in target_files}
+    # Work out which source photos are missing from target, by name or by content.
+    # Only files whose size matches a target file are ever hashed.
+    cache_path = os.path.join(backup_folder, HASH_CACHE_NAME)
+    hash_cache = load_hash_cache(cache_path)
+    pairs = []
+    duplicate_count = 0
+    for source_file in get_image_files(source_folder):
+        if os.path.basename(source_file).lower() in target_filenames:
+            continue
+        same_size = target_by_size.get(os.stat(source_file).st_size)
+        if same_size and has_same_content(source_file, same_size, hash_cache):
+            duplicate_count += 1
+            continue
+        # Create the same relative path structure in target
+        rel_path = os.path.relpath(source_file, source_folder)
+        pairs.append((source_file, os.path.join(target_folder, rel_path)))
+    save_hash_cache(cache_path, hash_cache)
 
     # Process source files
     print("Processing source photos...")
     copied_count = 0
     errors = []
 
-    for source_file in tqdm(source_files):
-        try:
-            # If photo doesn't exist in target (by name), copy it
-            if source_file.name.lower() not in target_filenames:
-                # Create the same relative path structure in target
-                rel_path = os.path.relpath(source_file, source_folder)
-                target_path = os.path.join(target_folder, rel_path)
-                
-                # Copy file with metadata
-                if copy_file_with_metadata(source_file, target_path):
-                    copied_count += 1
-                else:
-                    errors.append((source_file, "Failed to copy file with metadata"))
-        except Exception as e:
-            errors.append((source_file, str(e)))
-            continue
+    # Copies are I/O-bound, so overlap them on a thread pool
+    copied = []
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = executor.map(lambda pair: copy_file(*pair), pairs)
+        for pair, (ok, error) in zip(pairs, tqdm(results, total=len(pairs))):
+            if ok:
+                copied.append(pair)
+            else:
+                errors.append((pair[0], error))
+
+    # Then sync metadata for all copied files in one pass through a single exiftool process
+    with exiftool.ExifToolHelper() as et:
+        for source_file, target_path in tqdm(copied, desc="Copying metadata"):
+            ok, error = copy_metadata(et, source_file, target_path)
+            if ok:
+                copied_count += 1
+            else:
+                errors.append((source_file, error))
 
     # Print summary
     print(f"\nMerge complete!")
     print(f"Successfully copied: {copied_count} photos")
+    print(f"Skipped (same content already in target): {duplicate_count} photos")
     if errors:
         print(f"Failed to copy: {len(errors)} files")
         print("\nErrors:")
@@ -1,81 +1,338 @@
 #!/usr/bin/env python3
 
+import mmap
 import os
 import shutil
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import subprocess
+import tempfile
+import json
+import filecmp
+from file_copy import fast_copy
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.heic')
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+# Camera folder scan results, reused while none of its directories change
+CAMERA_CACHE_NAME = '.photo_replacer_cache.json'
+# Created inside the phone folder; never scanned for photos itself
+BACKUP_FOLDER_NAME = '_replaced_photos_backup'
+# APP1 holds Exif and XMP, APP13 holds IPTC
+JPEG_METADATA_MARKERS = (0xE1, 0xED)
+
+def _jpeg_segments(data):
+    """
+    Split the header of a JPEG into its marker segments.
+    
+    Args:
+        data: JPEG file contents (bytes or mmap)
+    
+    Returns:
+        tuple: (list of (marker, start, end) segments, offset of the start-of-scan marker)
+    """
+    if data[:2] != b'\xff\xd8':
+        raise ValueError("Not a JPEG file")
+    
+    segments = []
+    pos = 2
+    while True:
+        if data[pos] != 0xFF:
+            raise ValueError(f"Invalid JPEG marker at offset {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker == 0xDA:
+            return segments, pos
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+        segments.append((marker, pos, end))
+        pos = end
+
+def _splice_jpeg_metadata(data_path, meta_path, dst_path):
+    """
+    Write the image in data_path to dst_path with the Exif, XMP and IPTC
+    segments of meta_path, without starting exiftool.
+    
+    The metadata segments of data_path are dropped entirely, so no camera-side
+    Exif or XMP tag survives. The exiftool path used for HEIC files copies the
+    phone tags over the camera ones instead, keeping camera tags the phone
+    file doesn't have.
+    
+    Raises ValueError or IndexError if either file is not a well-formed JPEG;
+    nothing is written to dst_path in that case.
+    """
+    with open(data_path, 'rb') as data_file, open(meta_path, 'rb') as meta_file:
+        with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+             mmap.mmap(meta_file.fileno(), 0, access=mmap.ACCESS_READ) as meta:
+            data_segments, scan_start = _jpeg_segments(data)
+            meta_segments, _ = _jpeg_segments(meta)
+            
+            with open(dst_path, 'wb') as dst:
+                dst.write(b'\xff\xd8')
+                # A JFIF APP0 segment has to come first
+                for marker, start, end in data_segments:
+                    if marker == 0xE0:
+                        dst.write(data[start:end])
+                for marker, start, end in meta_segments:
+                    if marker in JPEG_METADATA_MARKERS:
+                        dst.write(meta[start:end])
+                # Keep the camera file's ICC profile, quantization and Huffman tables
+                for marker, start, end in data_segments:
+                    if marker != 0xE0 and marker not in JPEG_METADATA_MARKERS:
+                        dst.write(data[start:end])
+                dst.write(data[scan_start:])
+
+def _backup_file(source_path, backup_path):
+    """Back up a file as a hardlink, falling back to a clone and then a full copy."""
+    # A hardlink costs no I/O and shares the inode, so the backup keeps every bit of
+    # metadata. The original must then only ever be replaced, never written in place.
+    if os.path.lexists(backup_path):
+        os.unlink(backup_path)
+    try:
+        os.link(source_path, backup_path)
+        return
+    except OSError:
+        # Different filesystem, or one without hardlinks
+        pass
+    fast_copy(source_path, backup_path)
 
 class PhotoReplacer:
-    def __init__(self, phone_folder: str, camera_folder: str):
+    def __init__(self, phone_folder: str, camera_folder: str, *,
+                 extensions=IMAGE_EXTENSIONS, preserve_metadata=True):
         """
         Initialize the PhotoReplacer with paths to phone and camera folders.
         
         Args:
             phone_folder (str): Path to the folder containing phone photos
             camera_folder (str): Path to the folder containing camera photos
+            extensions (tuple): File extensions of the photos to match, e.g. '.jpg' or 'JPG'
+            preserve_metadata (bool): Keep the phone photos' metadata on their replacements
         """
-        self.phone_folder = Path(phone_folder)
-        self.camera_folder = Path(camera_folder)
+        self.phone_folder = os.fspath(phone_folder)
+        self.camera_folder = os.fspath(camera_folder)
+        # Normalized once so the scan can test each name with a single endswith
+        self.extensions = tuple(ext.lower() if ext.startswith('.') else '.' + ext.lower()
+                                for ext in extensions)
+        self.preserve_metadata = preserve_metadata
+        self.backup_folder = os.path.join(self.phone_folder, BACKUP_FOLDER_NAME)
         
-        if not self.phone_folder.exists():
+        if not os.path.isdir(self.phone_folder):
             raise ValueError(f"Phone folder does not exist: {phone_folder}")
-        if not self.camera_folder.exists():
+        if not os.path.isdir(self.camera_folder):
             raise ValueError(f"Camera folder does not exist: {camera_folder}")
 
-    def get_image_files(self, folder: Path) -> list:
-        """Get all image files in a folder and its subfolders."""
-        image_files = []
+    def get_image_files(self, folder, dir_mtimes=None):
+        """
+        Yield (lowercased filename, path) for all image files in a folder and its subfolders.
+        
+        Args:
+            folder (str): Folder to scan
+            dir_mtimes (dict, optional): Filled with the mtime of every directory scanned,
+                or None for directories that couldn't be listed
+        """
+        # os.scandir entries know whether they are directories without an extra stat,
+        # and paths stay plain strings instead of a Path object per file
+        stack = [folder]
+        while stack:
+            directory = stack.pop()
+            try:
+                if dir_mtimes is not None:
+                    dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                entries = os.scandir(directory)
+            except OSError:
+                # Skip folders that can't be listed, as os.walk did. With no mtime
+                # recorded, a cached scan is never trusted while one is unreadable.
+                if dir_mtimes is not None:
+                    dir_mtimes[directory] = None
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Backups from an earlier run would otherwise match their own
+                        # camera photos and be replaced themselves
+                        if entry.path != self.backup_folder:
+                            stack.append(entry.path)
+                    else:
+                        name = entry.name.lower()
+                        if name.endswith(self.extensions):
+                            yield name, entry.path
+
+    def scan_camera_folder(self):
+        """
+        Map lowercased filenames to paths for every image in the camera folder.
         
-        for root, _, files in os.walk(folder):
-            for file in files:
-                if Path(file).suffix.lower() in {'.jpg', '.jpeg', '.heic'}:
-                    image_files.append(Path(root) / file)
+        The result is cached in the camera folder and reused on later runs with the same
+        extensions as long as no directory in it has been modified, i.e. no file was added,
+        removed or renamed.
+        """
+        cache_path = os.path.join(self.camera_folder, CAMERA_CACHE_NAME)
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache['extensions'] == list(self.extensions) and all(
+                    os.stat(directory).st_mtime_ns == mtime
+                    for directory, mtime in cache['dirs'].items()):
+                return cache['files']
+        except (OSError, ValueError, KeyError, AttributeError):
+            # No cache yet, an unreadable one, or a directory that no longer exists
+            pass
+        
+        # Create the cache file before scanning, so writing it afterwards doesn't
+        # change the camera folder's mtime and invalidate the cache straight away
+        try:
+            open(cache_path, 'a').close()
+        except OSError:
+            pass
         
-        return image_files
+        dir_mtimes = {}
+        camera_dict = dict(self.get_image_files(self.camera_folder, dir_mtimes))
+        try:
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump({'extensions': self.extensions, 'dirs': dir_mtimes,
+                           'files': camera_dict}, f)
+        except OSError:
+            # A read-only camera folder just means no cache
+            pass
+        return camera_dict
 
     def find_matching_photos(self) -> list:
         """Find matching photos between phone and camera folders by filename."""
         print("Scanning folders for images...")
-        phone_images = self.get_image_files(self.phone_folder)
-        camera_images = self.get_image_files(self.camera_folder)
+        # Create a dictionary of camera images by filename
+        camera_dict = self.scan_camera_folder()
+        
+        # Nothing can match, so don't walk the phone folder at all
+        if not camera_dict:
+            return []
         
         matches = []
         print("Finding matching photos...")
         
-        # Create a dictionary of camera images by filename
-        camera_dict = {img.name.lower(): img for img in camera_images}
-        
-        # Find matches in phone images
-        for phone_img in tqdm(phone_images, desc="Processing phone images"):
-            if phone_img.name.lower() in camera_dict:
-                matches.append((phone_img, camera_dict[phone_img.name.lower()]))
+        # Find matches in phone images, streamed straight from the folder scan
+        # The loop body is a single dict lookup, so cap progress bar redraws
+        for name, phone_img in tqdm(self.get_image_files(self.phone_folder),
+                                    desc="Processing phone images", mininterval=0.5):
+            camera_img = camera_dict.get(name)
+            if camera_img:
+                matches.append((phone_img, camera_img))
         
         return matches
 
-    def copy_file_with_metadata(self, source_path, target_path, original_path=None):
+    def copy_metadata(self, pairs):
+        """
+        Copy all metadata onto many files with a single exiftool run.
+        
+        Args:
+            pairs (list): (metadata_source, target_path) tuples
+        
+        Returns:
+            dict: Error message for each target path whose metadata was not written
+        """
+        if not pairs:
+            return {}
+        
+        # One argfile holds every -TagsFromFile operation, separated by -execute,
+        # so exiftool starts once and no command line gets too long. It is written
+        # as bytes with the paths exactly as the filesystem stores them.
+        with tempfile.NamedTemporaryFile('wb', suffix='.args', delete=False) as argfile:
+            argfile.write(b''.join(
+                b'-TagsFromFile\n' + os.fsencode(metadata_source) +
+                b'\n-all:all\n-overwrite_original\n' + os.fsencode(target_path) + b'\n-execute\n'
+                for metadata_source, target_path in pairs))
+        # -efile3 makes every operation append the files it failed to write (1) or
+        # left unchanged (2), e.g. because the -TagsFromFile source couldn't be read
+        failed_list = argfile.name + '.failed'
+        try:
+            result = subprocess.run(['exiftool', '-@', argfile.name,
+                                     '-common_args', '-efile3', failed_list], capture_output=True)
+        except Exception as e:
+            return {target_path: f"Error copying metadata: {str(e)}" for _, target_path in pairs}
+        finally:
+            os.unlink(argfile.name)
+        
+        try:
+            with open(failed_list, 'rb') as f:
+                failed = set(f.read().splitlines())
+            os.unlink(failed_list)
+        except FileNotFoundError:
+            # exiftool only creates the list when something failed
+            failed = set()
+        
+        # Without a list of failed files, a non-zero exit status can't be pinned on
+        # any one file, so nothing in the batch counts as written
+        fail_all = result.returncode != 0 and not failed
+        
+        # Match exiftool's error and warning lines back to the files they are about
+        messages = [line for line in result.stderr.splitlines()
+                    if line.startswith((b'Error', b'Warning'))]
+        errors = {}
+        for metadata_source, target_path in pairs:
+            encoded_target = os.fsencode(target_path)
+            encoded_source = os.fsencode(metadata_source)
+            explained = [line for line in messages
+                         if encoded_target in line or encoded_source in line]
+            if (encoded_target in failed or fail_all
+                    or any(line.startswith(b'Error') and encoded_target in line for line in explained)):
+                if explained:
+                    errors[target_path] = os.fsdecode(explained[0])
+                else:
+                    errors[target_path] = f"exiftool exited with status {result.returncode} without writing metadata"
+        return errors
+
+    def _replace_one(self, phone_img, camera_img, backup_folder):
         """
-        Copy file and preserve all metadata.
-        If original_path is provided, preserve its metadata instead of source_path's metadata.
+        Back up one phone photo and copy its camera counterpart over it.
+        
+        Returns:
+            tuple: (backup_path, error, needs_metadata), where error is None on success
+                   and needs_metadata is True if exiftool still has to copy the metadata.
+                   backup_path is None if the two photos were already identical.
         """
+        # Nothing to do if the phone photo already is the camera photo
         try:
-            # First, copy the file with shutil to handle the data
-            shutil.copy2(source_path, target_path)
-            
-            # Then use exiftool to copy all metadata
-            # If original_path is provided, use its metadata
-            metadata_source = str(original_path if original_path else source_path)
-            
-            subprocess.run(
-                ['exiftool', '-TagsFromFile', metadata_source, 
-                 '-all:all', '-overwrite_original', str(target_path)],
-                check=True, capture_output=True
-            )
-            
-            return True
+            if (os.path.getsize(phone_img) == os.path.getsize(camera_img)
+                    and filecmp.cmp(phone_img, camera_img, shallow=False)):
+                return None, None, False
+        except OSError:
+            # Let the backup and copy below report the problem
+            pass
+        
+        # Mirror the phone folder layout so same-named photos in different
+        # subfolders never share (and race on) a backup file
+        backup_path = os.path.join(backup_folder, os.path.relpath(phone_img, self.phone_folder))
+        
+        # First backup the phone photo
+        try:
+            os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+            _backup_file(phone_img, backup_path)
+        except Exception as e:
+            return backup_path, f"Failed to create backup: {str(e)}", False
+        
+        # The new version is written beside the phone photo and renamed over it, so
+        # a hardlinked backup keeps pointing at the untouched original
+        tmp_path = phone_img + '.tmp'
+        
+        # Between two JPEGs the metadata segments can be spliced in directly
+        if self.preserve_metadata and phone_img.lower().endswith(JPEG_EXTENSIONS) and camera_img.lower().endswith(JPEG_EXTENSIONS):
+            try:
+                _splice_jpeg_metadata(camera_img, backup_path, tmp_path)
+                shutil.copystat(camera_img, tmp_path)
+                os.replace(tmp_path, phone_img)
+                return backup_path, None, False
+            except (OSError, ValueError, IndexError):
+                # Fall back to a plain copy and let exiftool handle the metadata
+                pass
+        
+        # Replace with camera version
+        try:
+            fast_copy(camera_img, tmp_path)
+            os.replace(tmp_path, phone_img)
         except Exception as e:
-            print(f"Error copying file and metadata: {str(e)}")
-            return False
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return backup_path, f"Failed to replace with camera version: {str(e)}", False
+        return backup_path, None, self.preserve_metadata
 
     def replace_photos(self):
         """Replace lower resolution phone photos with their camera counterparts while preserving metadata."""
@@ -89,75 +346,71 @@ class PhotoReplacer:
         print("Replacing phone photos with camera versions...")
         
         # Create backup folder
-        backup_folder = self.phone_folder / '_replaced_photos_backup'
-        backup_folder.mkdir(exist_ok=True)
+        backup_folder = self.backup_folder
+        os.makedirs(backup_folder, exist_ok=True)
         
         # Replace photos
         replaced_count = 0
+        identical_count = 0
         errors = []
         
-        for phone_img, camera_img in tqdm(matches, desc="Replacing photos"):
-            try:
-                # Create backup path
-                backup_path = backup_folder / phone_img.name
-                
-                # First backup the phone photo with its metadata
-                if not self.copy_file_with_metadata(phone_img, backup_path):
-                    errors.append((phone_img, "Failed to create backup"))
-                    continue
-                
-                # Replace with camera version while preserving phone photo's metadata
-                if self.copy_file_with_metadata(camera_img, phone_img, original_path=phone_img):
-                    replaced_count += 1
+        # Copy the image data first; JPEGs get their metadata spliced in as they are
+        # copied, everything else is handled afterwards by a single exiftool run.
+        # The copies are I/O-bound and touch separate files, so they run in parallel.
+        replaced = []
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = {
+                executor.submit(self._replace_one, phone_img, camera_img, backup_folder): phone_img
+                for phone_img, camera_img in matches
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Replacing photos",
+                               mininterval=0.5, miniters=max(1, len(futures) // 100)):
+                phone_img = futures[future]
+                backup_path, error, needs_metadata = future.result()
+                if error:
+                    errors.append((phone_img, error))
+                elif backup_path is None:
+                    identical_count += 1
+                elif needs_metadata:
+                    replaced.append((backup_path, phone_img))
                 else:
-                    errors.append((phone_img, "Failed to replace with camera version"))
-                
-            except Exception as e:
-                errors.append((phone_img, str(e)))
-                continue
+                    replaced_count += 1
         
+        # Preserve the phone photo's metadata, read from its backup since the
+        # phone file itself now holds the camera version
+        if replaced:
+            print("Copying phone metadata onto replaced photos...")
+        metadata_errors = self.copy_metadata(replaced)
+        for _, phone_img in replaced:
+            if phone_img in metadata_errors:
+                errors.append((phone_img, metadata_errors[phone_img]))
+            else:
+                replaced_count += 1
+
         # Print summary
         print(f"\nReplacement complete!")
         print(f"Successfully replaced: {replaced_count} photos")
+        if identical_count:
+            print(f"Skipped already identical: {identical_count} photos")
         if errors:
             print(f"Failed to replace: {len(errors)} files")
             print("\nErrors:")
             for file, error in errors:
                 print(f"{file}: {error}")
 
-def mov_deleter(directory_path):
-    """
-    Deletes .MOV files that have corresponding .HEIC files with the same name,
-    but only if the filename starts with 'IMG_'
-    
-    Args:
-        directory_path (str): Path to the directory containing the files
-    """
-    # Get all HEIC files that start with IMG_
-    heic_files = [f for f in os.listdir(directory_path) 
-                  if f.upper().endswith('.HEIC') and f.startswith('IMG_')]
-    
-    # Get base names without extension
-    heic_bases = [os.path.splitext(f)[0] for f in heic_files]
-    
-    # Check for corresponding MOV files
-    for base_name in heic_bases:
-        mov_path = os.path.join(directory_path, base_name + '.MOV')
-        if os.path.exists(mov_path):
-            try:
-                os.remove(mov_path)
-                print(f"Deleted: {mov_path}")
-            except Exception as e:
-                print(f"Error deleting {mov_path}: {e}")
-
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Replace phone photos with matching camera photos")
     parser.add_argument("phone_folder", help="Folder containing phone photos")
     parser.add_argument("camera_folder", help="Folder containing camera photos")
+    parser.add_argument("--extensions", nargs="+", default=IMAGE_EXTENSIONS,
+                        help="File extensions to match (default: .jpg .jpeg .heic)")
+    parser.add_argument("--no-metadata", dest="preserve_metadata", action="store_false",
+                        help="Don't copy the phone photos' metadata onto their replacements")
     args = parser.parse_args()
     
-    replacer = PhotoReplacer(args.phone_folder, args.camera_folder)
+    replacer = PhotoReplacer(args.phone_folder, args.camera_folder,
+                             extensions=args.extensions, preserve_metadata=args.preserve_metadata)
     replacer.replace_photos()
 
 if __name__ == "__main__":
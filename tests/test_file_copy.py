@@ -0,0 +1,42 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import file_copy
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.jpg"
+    path.write_bytes(os.urandom(300_000))
+    os.utime(path, (1_600_000_000, 1_600_000_000))
+    return path
+
+
+def test_fast_copy_copies_data_and_timestamps(tmp_path, source):
+    target = tmp_path / "target.jpg"
+
+    file_copy.fast_copy(source, target)
+
+    assert target.read_bytes() == source.read_bytes()
+    assert target.stat().st_mtime == source.stat().st_mtime
+
+
+@pytest.mark.parametrize("chunks", [[0], [4096, 0]], ids=["nothing", "short"])
+def test_early_zero_from_copy_file_range_falls_back_to_copyfile(
+    monkeypatch, tmp_path, source, chunks
+):
+    results = iter(chunks)
+    monkeypatch.setattr(file_copy, "clone_file", lambda *paths: False)
+    monkeypatch.setattr(
+        file_copy.os, "copy_file_range", lambda src, dst, count: next(results), raising=False
+    )
+    target = tmp_path / "target.jpg"
+
+    file_copy.fast_copy(source, target)
+
+    assert target.read_bytes() == source.read_bytes()
@@ -0,0 +1,151 @@
+import struct
+import sys
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("tqdm")
+pytest.importorskip("piexif")
+pytest.importorskip("exiftool")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import fix_dates
+
+DATETIME = "2021:01:02 03:04:05"
+DATETIME_ORIGINAL = "2020:06:07 08:09:10"
+
+
+def _tiff_block(endian: str, exif_ifd: bool = True) -> bytes:
+    """Build a minimal TIFF EXIF block with an IFD0 DateTime and an Exif IFD DateTimeOriginal."""
+    order = b"II" if endian == "<" else b"MM"
+    ifd0_count = 2 if exif_ifd else 1
+    ifd0_end = 8 + 2 + 12 * ifd0_count + 4
+    exif_end = ifd0_end + 2 + 12 + 4 if exif_ifd else ifd0_end
+    datetime_offset = exif_end
+    original_offset = datetime_offset + 20
+
+    block = order + struct.pack(endian + "HI", 42, 8)
+    block += struct.pack(endian + "H", ifd0_count)
+    block += struct.pack(endian + "HHII", 0x0132, 2, 20, datetime_offset)
+    if exif_ifd:
+        block += struct.pack(endian + "HHII", 0x8769, 4, 1, ifd0_end)
+    block += struct.pack(endian + "I", 0)
+    if exif_ifd:
+        block += struct.pack(endian + "H", 1)
+        block += struct.pack(endian + "HHII", 0x9003, 2, 20, original_offset)
+        block += struct.pack(endian + "I", 0)
+    block += DATETIME.encode() + b"\0"
+    if exif_ifd:
+        block += DATETIME_ORIGINAL.encode() + b"\0"
+    return block
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + (len(payload) + 2).to_bytes(2, "big") + payload
+
+
+def _jpeg_with_exif(tiff: bytes) -> bytes:
+    return (
+        b"\xff\xd8"
+        + _segment(0xE0, b"JFIF\0")
+        + b"\xff"
+        + _segment(0xE1, b"Exif\0\0" + tiff)
+        + b"\xff\xda\x00\x02\xff\xd9"
+    )
+
+
+@pytest.mark.parametrize("endian", ["<", ">"], ids=["II", "MM"])
+def test_reads_datetime_original_from_tiff(tmp_path, endian):
+    path = tmp_path / "photo.tif"
+    path.write_bytes(_tiff_block(endian))
+
+    assert fix_dates._read_exif_datetime(path) == DATETIME_ORIGINAL
+
+
+@pytest.mark.parametrize("endian", ["<", ">"], ids=["II", "MM"])
+def test_reads_datetime_original_from_jpeg_app1(tmp_path, endian):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(_jpeg_with_exif(_tiff_block(endian)))
+
+    assert fix_dates._read_exif_datetime(path) == DATETIME_ORIGINAL
+    assert fix_dates.get_creation_date_pillow(path) == datetime(2020, 6, 7, 8, 9, 10)
+
+
+@pytest.mark.parametrize("endian", ["<", ">"], ids=["II", "MM"])
+def test_falls_back_to_ifd0_datetime_without_exif_ifd(tmp_path, endian):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(_jpeg_with_exif(_tiff_block(endian, exif_ifd=False)))
+
+    assert fix_dates._read_exif_datetime(path) == DATETIME
+
+
+def test_jpeg_without_exif_has_no_date(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"\xff\xd8" + _segment(0xE0, b"JFIF\0") + b"\xff\xda\x00\x02\xff\xd9")
+
+    assert fix_dates._read_exif_datetime(path) is None
+
+
+def test_exif_beyond_header_window_falls_back_to_piexif(tmp_path):
+    buffer = BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, "JPEG", exif=b"Exif\0\0" + _tiff_block(">"))
+    saved = buffer.getvalue()
+    # Two near-maximal APP2 segments before the Exif APP1 push it past the bytes read directly
+    padding = _segment(0xE2, b"\0" * 65000) * 2
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(saved[:2] + padding + saved[2:])
+    assert path.stat().st_size > fix_dates.EXIF_HEADER_BYTES
+
+    with pytest.raises(ValueError):
+        fix_dates._read_exif_datetime(path)
+    assert fix_dates.get_creation_date_pillow(path) == datetime(2020, 6, 7, 8, 9, 10)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2023:05:06 07:08:09",
+        "2023:05:06 07:08:09.123",
+        "2023:05:06 07:08:09+02:00",
+        "2023:05:06 07:08:09-07:00",
+        "2023:05:06 07:08:09.45-07:00",
+    ],
+)
+def test_parse_exif_dt_ignores_subseconds_and_offsets(value):
+    assert fix_dates._parse_exif_dt(value) == datetime(2023, 5, 6, 7, 8, 9)
+
+
+@pytest.mark.parametrize("value", ["", "0000:00:00 00:00:00", "2023:13:01 00:00:00", "not a date"])
+def test_parse_exif_dt_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        fix_dates._parse_exif_dt(value)
+
+
+def test_tags_skip_unparseable_fields():
+    tags = {"ContentCreateDate": "0000:00:00 00:00:00", "CreationDate": "2022:02:03 04:05:06-07:00"}
+
+    assert fix_dates.get_creation_date_from_tags(tags) == datetime(2022, 2, 3, 4, 5, 6)
+
+
+def test_walk_files_skips_folders_that_cannot_be_listed(monkeypatch, tmp_path):
+    (tmp_path / "readable").mkdir()
+    (tmp_path / "locked").mkdir()
+    (tmp_path / "top.jpg").write_bytes(b"")
+    (tmp_path / "readable" / "inner.jpg").write_bytes(b"")
+    (tmp_path / "locked" / "hidden.jpg").write_bytes(b"")
+    real_scandir = fix_dates.os.scandir
+
+    def scandir(path):
+        if str(path).endswith("locked"):
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(fix_dates.os, "scandir", scandir)
+
+    assert sorted(fix_dates.walk_files(tmp_path)) == [
+        str(tmp_path / "readable" / "inner.jpg"),
+        str(tmp_path / "top.jpg"),
+    ]
@@ -0,0 +1,98 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("tqdm")
+pytest.importorskip("exiftool")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import heic_to_jpg
+
+
+class FakeExifTool:
+    """Stands in for a session whose exiftool exits non-zero because one file is unreadable."""
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.check_execute = True
+
+    def get_tags(self, files, tags):
+        if self.check_execute:
+            raise RuntimeError("exiftool exited with status 1")
+        return self.metadata
+
+
+def test_find_edited_files_survives_one_unreadable_file(tmp_path):
+    edited = tmp_path / "IMG_1.HEIC"
+    plain = tmp_path / "IMG_2.HEIC"
+    broken = tmp_path / "IMG_3.HEIC"
+    et = FakeExifTool(
+        [
+            {"SourceFile": str(edited), "XMP:AdjustmentType": "Crop"},
+            {"SourceFile": str(plain)},
+            {"SourceFile": str(broken), "ExifTool:Error": "File is empty"},
+        ]
+    )
+
+    assert heic_to_jpg.find_edited_files(et, [edited, plain, broken]) == {edited}
+    assert et.check_execute is True
+
+
+class RecordingExifTool:
+    """Stands in for the parent's exiftool session, failing metadata copies onto some files."""
+
+    def __init__(self, fail_for=()):
+        self.fail_for = set(fail_for)
+        self.check_execute = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def get_tags(self, files, tags):
+        return [{"SourceFile": file} for file in files]
+
+    def execute(self, *params):
+        if params[-1] in self.fail_for:
+            raise RuntimeError("exiftool exited with status 1")
+
+
+def _write_heic(path):
+    pillow_heif = pytest.importorskip("pillow_heif")
+    from PIL import Image
+
+    pillow_heif.from_pillow(Image.new("RGB", (16, 16), "red")).save(path, quality=90)
+
+
+def test_convert_replaces_stale_jpg_and_only_names_it_after_metadata(monkeypatch, tmp_path):
+    heic = tmp_path / "IMG_1.HEIC"
+    _write_heic(heic)
+    stale = tmp_path / "IMG_1.jpg"
+    stale.write_bytes(b"stale")
+    stat = heic.stat()
+    os.utime(stale, (stat.st_atime - 60, stat.st_mtime - 60))
+    monkeypatch.setattr(heic_to_jpg.exiftool, "ExifToolHelper", lambda: RecordingExifTool())
+
+    heic_to_jpg.convert_heic_to_jpg(str(tmp_path))
+
+    assert stale.read_bytes()[:2] == b"\xff\xd8"
+    assert not list(tmp_path.glob("*.tmp.jpg"))
+
+
+def test_failed_metadata_copy_leaves_no_jpg(monkeypatch, tmp_path):
+    heic = tmp_path / "IMG_2.HEIC"
+    _write_heic(heic)
+    staged = str(tmp_path / "IMG_2.tmp.jpg")
+    monkeypatch.setattr(
+        heic_to_jpg.exiftool, "ExifToolHelper", lambda: RecordingExifTool(fail_for=[staged])
+    )
+
+    heic_to_jpg.convert_heic_to_jpg(str(tmp_path), delete_original=True)
+
+    assert heic.exists()
+    assert not (tmp_path / "IMG_2.jpg").exists()
+    assert not list(tmp_path.glob("*.tmp.jpg"))
@@ -0,0 +1,293 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("tqdm")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import photo_replacer
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + (len(payload) + 2).to_bytes(2, "big") + payload
+
+
+SCAN = b"\xff\xda\x00\x02SCANDATA\xff\xd9"
+CAMERA_JPEG = (
+    b"\xff\xd8"
+    + _segment(0xE0, b"JFIF\x00camera")
+    + _segment(0xE1, b"Exif\x00\x00camera")
+    + _segment(0xE2, b"ICC_PROFILE\x00camera")
+    + _segment(0xDB, b"quant")
+    + SCAN
+)
+PHONE_JPEG = (
+    b"\xff\xd8"
+    + _segment(0xE1, b"Exif\x00\x00phone")
+    + _segment(0xE1, b"http://ns.adobe.com/xap/1.0/\x00phone")
+    + _segment(0xED, b"Photoshop 3.0\x00phone")
+    + _segment(0xDB, b"phone-quant")
+    + b"\xff\xda\x00\x02phone-scan\xff\xd9"
+)
+
+
+def test_splice_orders_camera_app0_phone_metadata_then_camera_segments(tmp_path):
+    camera = tmp_path / "camera.jpg"
+    phone = tmp_path / "phone.jpg"
+    destination = tmp_path / "out.jpg"
+    camera.write_bytes(CAMERA_JPEG)
+    phone.write_bytes(PHONE_JPEG)
+
+    photo_replacer._splice_jpeg_metadata(camera, phone, destination)
+
+    assert destination.read_bytes() == (
+        b"\xff\xd8"
+        + _segment(0xE0, b"JFIF\x00camera")
+        + _segment(0xE1, b"Exif\x00\x00phone")
+        + _segment(0xE1, b"http://ns.adobe.com/xap/1.0/\x00phone")
+        + _segment(0xED, b"Photoshop 3.0\x00phone")
+        + _segment(0xE2, b"ICC_PROFILE\x00camera")
+        + _segment(0xDB, b"quant")
+        + SCAN
+    )
+
+
+def test_segments_skip_fill_bytes_before_markers():
+    data = b"\xff\xd8" + b"\xff\xff" + _segment(0xE1, b"Exif") + b"\xff\xff\xff" + SCAN
+
+    segments, scan_start = photo_replacer._jpeg_segments(data)
+
+    assert segments == [(0xE1, 4, 12)]
+    assert data[scan_start:] == SCAN
+
+
+@pytest.mark.parametrize(
+    "camera_bytes",
+    [
+        b"",
+        b"not a jpeg at all",
+        CAMERA_JPEG[:20],
+        b"\xff\xd8\x00\x00" + CAMERA_JPEG[2:],
+    ],
+    ids=["empty", "not-jpeg", "truncated", "bad-marker"],
+)
+def test_unparseable_jpeg_falls_back_to_exiftool(monkeypatch, tmp_path, camera_bytes):
+    phone_folder = tmp_path / "phone"
+    camera_folder = tmp_path / "camera"
+    phone_folder.mkdir()
+    camera_folder.mkdir()
+    (phone_folder / "IMG_1.jpg").write_bytes(PHONE_JPEG)
+    (camera_folder / "IMG_1.JPG").write_bytes(camera_bytes)
+    exiftool_pairs = []
+    monkeypatch.setattr(
+        photo_replacer.PhotoReplacer,
+        "copy_metadata",
+        lambda self, pairs: exiftool_pairs.extend(pairs) or {},
+    )
+
+    photo_replacer.PhotoReplacer(str(phone_folder), str(camera_folder)).replace_photos()
+
+    backup = phone_folder / photo_replacer.BACKUP_FOLDER_NAME / "IMG_1.jpg"
+    assert (phone_folder / "IMG_1.jpg").read_bytes() == camera_bytes
+    assert backup.read_bytes() == PHONE_JPEG
+    assert exiftool_pairs == [(str(backup), str(phone_folder / "IMG_1.jpg"))]
+    assert not list(phone_folder.glob("*.tmp"))
+
+
+def test_spliced_jpeg_skips_exiftool_and_keeps_backup(monkeypatch, tmp_path):
+    phone_folder = tmp_path / "phone"
+    camera_folder = tmp_path / "camera"
+    (phone_folder / "trip").mkdir(parents=True)
+    camera_folder.mkdir()
+    (phone_folder / "trip" / "IMG_2.jpg").write_bytes(PHONE_JPEG)
+    (camera_folder / "IMG_2.jpg").write_bytes(CAMERA_JPEG)
+    exiftool_pairs = []
+    monkeypatch.setattr(
+        photo_replacer.PhotoReplacer,
+        "copy_metadata",
+        lambda self, pairs: exiftool_pairs.extend(pairs) or {},
+    )
+
+    photo_replacer.PhotoReplacer(str(phone_folder), str(camera_folder)).replace_photos()
+
+    replaced = (phone_folder / "trip" / "IMG_2.jpg").read_bytes()
+    assert b"Exif\x00\x00phone" in replaced
+    assert b"Exif\x00\x00camera" not in replaced
+    assert replaced.endswith(SCAN)
+    backup = phone_folder / photo_replacer.BACKUP_FOLDER_NAME / "trip" / "IMG_2.jpg"
+    assert backup.read_bytes() == PHONE_JPEG
+    assert exiftool_pairs == []
+
+
+def test_scan_skips_folders_that_cannot_be_listed(monkeypatch, tmp_path):
+    phone_folder = tmp_path / "phone"
+    camera_folder = tmp_path / "camera"
+    (phone_folder / "locked").mkdir(parents=True)
+    (camera_folder / "locked").mkdir(parents=True)
+    (phone_folder / "IMG_1.jpg").write_bytes(b"phone")
+    (camera_folder / "IMG_1.jpg").write_bytes(b"camera")
+    (phone_folder / "locked" / "IMG_2.jpg").write_bytes(b"phone")
+    (camera_folder / "locked" / "IMG_2.jpg").write_bytes(b"camera")
+    real_scandir = photo_replacer.os.scandir
+
+    def scandir(path):
+        if str(path).endswith("locked"):
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(photo_replacer.os, "scandir", scandir)
+    replacer = photo_replacer.PhotoReplacer(str(phone_folder), str(camera_folder))
+
+    assert replacer.find_matching_photos() == [
+        (str(phone_folder / "IMG_1.jpg"), str(camera_folder / "IMG_1.jpg"))
+    ]
+
+
+STUB_EXIFTOOL = """#!{python}
+import os
+import os
+import sys
+
+args = sys.argv[1:]
+failed_list = args[args.index("-efile3") + 1]
+with open(args[args.index("-@") + 1], "rb") as argfile:
+    operations = [op.split(b"\\n") for op in argfile.read().split(b"-execute\\n") if op]
+for operation in operations:
+    source, target = operation[1], operation[4]
+    if b"unreadable" in source:
+        sys.stderr.buffer.write(b"Warning: Error opening file - " + source + b"\\n")
+        with open(failed_list, "ab") as listing:
+            listing.write(target + b"\\n")
+    if b"broken" in target:
+        sys.stderr.buffer.write(b"Error: Not a valid JPG - " + target + b"\\n")
+sys.exit(int(os.environ.get("STUB_EXIFTOOL_STATUS", "0")))
+"""
+
+
+@pytest.fixture
+def stub_exiftool(monkeypatch, tmp_path):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "exiftool"
+    script.write_text(STUB_EXIFTOOL.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return monkeypatch
+
+
+def _copy_metadata(tmp_path, pairs):
+    replacer = photo_replacer.PhotoReplacer(str(tmp_path), str(tmp_path))
+    return replacer.copy_metadata(
+        [(str(tmp_path / src), str(tmp_path / dst)) for src, dst in pairs]
+    )
+
+
+def test_copy_metadata_succeeds_when_exiftool_reports_nothing(stub_exiftool, tmp_path):
+    assert (
+        _copy_metadata(tmp_path, [("a-backup.heic", "a.heic"), ("b-backup.heic", "b.heic")]) == {}
+    )
+
+
+def test_copy_metadata_fails_targets_on_the_efile_list(stub_exiftool, tmp_path):
+    stub_exiftool.setenv("STUB_EXIFTOOL_STATUS", "1")
+
+    errors = _copy_metadata(
+        tmp_path, [("unreadable-backup.heic", "a.heic"), ("b-backup.heic", "b.heic")]
+    )
+
+    assert errors == {
+        str(tmp_path / "a.heic"): "Warning: Error opening file - "
+        + str(tmp_path / "unreadable-backup.heic")
+    }
+
+
+def test_copy_metadata_fails_targets_named_in_error_lines(stub_exiftool, tmp_path):
+    errors = _copy_metadata(tmp_path, [("a-backup.jpg", "broken.jpg"), ("b-backup.jpg", "b.jpg")])
+
+    assert errors == {
+        str(tmp_path / "broken.jpg"): "Error: Not a valid JPG - " + str(tmp_path / "broken.jpg")
+    }
+
+
+def test_copy_metadata_fails_whole_batch_on_unexplained_exit_status(stub_exiftool, tmp_path):
+    stub_exiftool.setenv("STUB_EXIFTOOL_STATUS", "1")
+
+    errors = _copy_metadata(tmp_path, [("a-backup.heic", "a.heic"), ("b-backup.heic", "b.heic")])
+
+    assert set(errors) == {str(tmp_path / "a.heic"), str(tmp_path / "b.heic")}
+    assert all("status 1" in error for error in errors.values())
+
+
+def _camera_tree(tmp_path):
+    camera_folder = tmp_path / "camera"
+    (camera_folder / "day1").mkdir(parents=True)
+    (camera_folder / "IMG_1.JPG").write_bytes(b"camera")
+    (camera_folder / "day1" / "IMG_2.jpg").write_bytes(b"camera")
+    (camera_folder / "day1" / "IMG_3.heic").write_bytes(b"camera")
+    phone_folder = tmp_path / "phone"
+    phone_folder.mkdir()
+    return str(phone_folder), camera_folder
+
+
+def _forbid_walk(monkeypatch):
+    def walk(*args, **kwargs):
+        raise AssertionError("camera folder was walked again")
+
+    monkeypatch.setattr(photo_replacer.PhotoReplacer, "get_image_files", walk)
+
+
+def test_camera_scan_cache_is_reused_without_walking(monkeypatch, tmp_path):
+    phone_folder, camera_folder = _camera_tree(tmp_path)
+    first = photo_replacer.PhotoReplacer(phone_folder, str(camera_folder)).scan_camera_folder()
+    assert (camera_folder / photo_replacer.CAMERA_CACHE_NAME).exists()
+
+    _forbid_walk(monkeypatch)
+    second = photo_replacer.PhotoReplacer(phone_folder, str(camera_folder)).scan_camera_folder()
+
+    assert second == first
+    assert set(first) == {"img_1.jpg", "img_2.jpg", "img_3.heic"}
+
+
+def test_camera_scan_cache_is_invalidated_by_a_new_file_in_a_subfolder(tmp_path):
+    phone_folder, camera_folder = _camera_tree(tmp_path)
+    photo_replacer.PhotoReplacer(phone_folder, str(camera_folder)).scan_camera_folder()
+    subfolder = camera_folder / "day1"
+    (subfolder / "IMG_4.jpg").write_bytes(b"camera")
+    # Make sure the change is visible even on filesystems with coarse timestamps
+    mtime_ns = subfolder.stat().st_mtime_ns + 1_000_000_000
+    os.utime(subfolder, ns=(mtime_ns, mtime_ns))
+
+    result = photo_replacer.PhotoReplacer(phone_folder, str(camera_folder)).scan_camera_folder()
+
+    assert result["img_4.jpg"] == str(subfolder / "IMG_4.jpg")
+
+
+def test_camera_scan_cache_is_invalidated_by_other_extensions(tmp_path):
+    phone_folder, camera_folder = _camera_tree(tmp_path)
+    photo_replacer.PhotoReplacer(
+        phone_folder, str(camera_folder), extensions=(".jpg",)
+    ).scan_camera_folder()
+
+    result = photo_replacer.PhotoReplacer(
+        phone_folder, str(camera_folder), extensions=(".heic",)
+    ).scan_camera_folder()
+
+    assert result == {"img_3.heic": str(camera_folder / "day1" / "IMG_3.heic")}
+
+
+def test_camera_scan_works_when_the_cache_cannot_be_written(monkeypatch, tmp_path):
+    phone_folder, camera_folder = _camera_tree(tmp_path)
+
+    def read_only_open(path, mode="r", *args, **kwargs):
+        if str(path).endswith(photo_replacer.CAMERA_CACHE_NAME) and mode != "r":
+            raise PermissionError(13, "Read-only file system", str(path))
+        return open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(photo_replacer, "open", read_only_open, raising=False)
+
+    result = photo_replacer.PhotoReplacer(phone_folder, str(camera_folder)).scan_camera_folder()
+
+    assert set(result) == {"img_1.jpg", "img_2.jpg", "img_3.heic"}
+    assert not (camera_folder / photo_replacer.CAMERA_CACHE_NAME).exists()